@@ -1,17 +1,22 @@
-import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba_array
+from matplotlib.lines import Line2D
 import numpy as np
 
-df = pd.read_csv("data/hp_obp.csv")
+from src.io import ensure_numeric, read_csv_cached
+
+df = read_csv_cached("data/hp_obp.csv")
 
 jump_col = "jump_height_(imp-mom)_[cm]_mean_cmj"
 bat_col = "bat_speed_mph"
 level_col = "playing_level"
 
+df[level_col] = df[level_col].astype("category")
+
 df_clean = df[[jump_col, bat_col, level_col]].dropna()
 
-df_clean[jump_col] = pd.to_numeric(df_clean[jump_col], errors="coerce")
-df_clean[bat_col] = pd.to_numeric(df_clean[bat_col], errors="coerce")
+df_clean = ensure_numeric(df_clean, jump_col)
+df_clean = ensure_numeric(df_clean, bat_col)
 
 df_clean = df_clean.dropna()
 
@@ -19,23 +24,29 @@ corr = df_clean[jump_col].corr(df_clean[bat_col])
 print("Overall Correlation (r):", round(corr, 3))
 print("R^2:", round(corr**2, 3))
 
-levels = df_clean[level_col].unique()
+level_cat = df_clean[level_col].cat.remove_unused_categories()
+level_codes = level_cat.cat.codes.to_numpy()
+levels = level_cat.cat.categories
+palette = [f"C{i}" for i in range(len(levels))]
 
-plt.figure()
+fig, ax = plt.subplots(figsize=(8, 5))
 
-for level in levels:
-    subset = df_clean[df_clean[level_col] == level]
-    plt.scatter(subset[jump_col], subset[bat_col], label=level)
+# Single scatter for all levels, colored per point by level
+ax.scatter(df_clean[jump_col], df_clean[bat_col], c=to_rgba_array(palette)[level_codes], rasterized=True)
+handles = [
+    Line2D([], [], marker="o", linestyle="", color=palette[i], label=level)
+    for i, level in enumerate(levels)
+]
 
 # Regression line (overall)
 x = df_clean[jump_col]
 y = df_clean[bat_col]
 coef = np.polyfit(x, y, 1)
 poly1d_fn = np.poly1d(coef)
-plt.plot(x, poly1d_fn(x))
+ax.plot(x, poly1d_fn(x), color=f"C{len(levels)}")
 
-plt.xlabel("Jump Height (cm)")
-plt.ylabel("Bat Speed (mph)")
-plt.title("Jump Height vs Bat Speed by Playing Level")
-plt.legend()
+ax.set_xlabel("Jump Height (cm)")
+ax.set_ylabel("Bat Speed (mph)")
+ax.set_title("Jump Height vs Bat Speed by Playing Level")
+ax.legend(handles=handles)
 plt.show()
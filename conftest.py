@@ -0,0 +1 @@
+# Lets pytest import the top-level scripts and the src package from the repo root.
@@ -1,40 +1,47 @@
 import argparse
+from io import BytesIO
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba_array
+from matplotlib.lines import Line2D
+
+from src.io import ensure_numeric, read_csv_cached
 
 # --- helpers ---
 
 def fit_line(x, y):
-    m, b = np.polyfit(x, y, 1)
-    return float(m), float(b)
-
-def filter_level(df_level: pd.DataFrame, jump_col: str, bat_col: str, min_bat: float = 40.0, z_cut: float = 3.0):
-    """Filters: bat >= min_bat and outliers within +/- z_cut SD for both CMJ and bat speed."""
-    df = df_level.copy()
-    df[jump_col] = pd.to_numeric(df[jump_col], errors="coerce")
-    df[bat_col] = pd.to_numeric(df[bat_col], errors="coerce")
+    xm = x.mean()
+    ym = y.mean()
+    m = ((x - xm) * (y - ym)).sum() / ((x - xm) ** 2).sum()
+    return float(m), float(ym - m * xm)
+
+def filter_levels(df: pd.DataFrame, jump_col: str, bat_col: str, level_col: str = "playing_level", min_bat: float = 40.0, z_cut: float = 3.0):
+    """
+    Filters every level in one pass: bat >= min_bat and outliers within +/- z_cut SD
+    (per level) for both CMJ and bat speed. Levels with < 10 rows or zero spread skip the z-cut.
+    """
+    cols = [level_col, jump_col, bat_col] + (["athlete_uid"] if "athlete_uid" in df.columns else [])
+    df = df[cols].copy()
+    df = ensure_numeric(df, jump_col)
+    df = ensure_numeric(df, bat_col)
     df = df.dropna(subset=[jump_col, bat_col])
 
     # bat speed cutoff
-    df = df[df[bat_col] >= min_bat].copy()
-    if len(df) < 10:
-        return df
-
-    j = df[jump_col].to_numpy(float)
-    b = df[bat_col].to_numpy(float)
+    df = df[df[bat_col] >= min_bat]
 
-    j_mu, j_sd = float(np.mean(j)), float(np.std(j, ddof=0))
-    b_mu, b_sd = float(np.mean(b)), float(np.std(b, ddof=0))
+    gb = df.groupby(level_col, sort=False, observed=True)
+    n = gb[jump_col].transform("size")
+    j_sd = gb[jump_col].transform("std", ddof=0)
+    b_sd = gb[bat_col].transform("std", ddof=0)
 
-    if j_sd == 0 or b_sd == 0:
-        return df
+    j_z = (df[jump_col] - gb[jump_col].transform("mean")) / j_sd
+    b_z = (df[bat_col] - gb[bat_col].transform("mean")) / b_sd
 
-    j_z = (j - j_mu) / j_sd
-    b_z = (b - b_mu) / b_sd
-    keep = (np.abs(j_z) <= z_cut) & (np.abs(b_z) <= z_cut)
+    skip = (n < 10) | (j_sd == 0) | (b_sd == 0)
+    keep = skip | ((j_z.abs() <= z_cut) & (b_z.abs() <= z_cut))
 
     return df.loc[keep].copy()
 
@@ -52,21 +59,23 @@ def analyze_level(df_level: pd.DataFrame, jump_col: str, bat_col: str):
     y_pred = m * x + b
     residual = y - y_pred
 
-    uid = df_level["athlete_uid"].astype(str).values if "athlete_uid" in df_level.columns else np.array([""] * len(df_level))
+    uid = df_level["athlete_uid"].to_numpy() if "athlete_uid" in df_level.columns else None
 
-    df_out = pd.DataFrame({
-        "athlete_uid": uid,
-        "cmj": x,
-        "actual": y,
-        "predicted": y_pred,
-        "residual": residual
-    })
+    # Only the two extreme athletes are reported, so build just those rows
+    def row(i: int) -> dict:
+        return {
+            "athlete_uid": str(uid[i]) if uid is not None else "",
+            "cmj": x[i],
+            "actual": y[i],
+            "predicted": y_pred[i],
+            "residual": residual[i]
+        }
 
-    top_over = df_out.sort_values("residual", ascending=False).iloc[0]
-    top_under = df_out.sort_values("residual", ascending=True).iloc[0]
+    top_over = row(int(residual.argmax()))
+    top_under = row(int(residual.argmin()))
 
     return {
-        "rows": len(df_out),
+        "rows": len(x),
         "m": m,
         "b": b,
         "r": r,
@@ -85,7 +94,7 @@ def main():
     ap.add_argument("--z_cut", type=float, default=3.0)
     args = ap.parse_args()
 
-    df = pd.read_csv(args.input)
+    df = read_csv_cached(args.input)
 
     # Your real numeric columns:
     jump_col = "jump_height_(imp-mom)_[cm]_mean_cmj"
@@ -105,18 +114,25 @@ def main():
     out_dir.mkdir(exist_ok=True)
     fig_dir.mkdir(parents=True, exist_ok=True)
 
-    # Analyze each level after filtering
-    results = {}
-    counts = []
+    # Dictionary-encode the level so grouping hashes small integer codes, not strings
+    df["playing_level"] = df["playing_level"].astype("category")
+    raw_counts = df["playing_level"].value_counts()
 
-    for lvl in levels:
-        raw = df[df["playing_level"] == lvl].copy()
-        raw_n = len(raw)
-        filt = filter_level(raw, jump_col, bat_col, min_bat=args.min_bat, z_cut=args.z_cut)
-        filt_n = len(filt)
-        counts.append({"playing_level": lvl, "rows_raw": raw_n, "rows_filtered": filt_n})
+    df_filt = filter_levels(df, jump_col, bat_col, min_bat=args.min_bat, z_cut=args.z_cut)
+
+    # One hash partition of the filtered rows, then per-level lookups
+    groups = dict(list(df_filt.groupby("playing_level", sort=False, observed=True)))
+
+    counts = [
+        {"playing_level": lvl, "rows_raw": int(raw_counts.get(lvl, 0)), "rows_filtered": len(groups.get(lvl, ()))}
+        for lvl in levels
+    ]
 
-        res = analyze_level(filt, jump_col, bat_col)
+    results = {}
+    for lvl in levels:
+        if lvl not in groups:
+            continue
+        res = analyze_level(groups[lvl], jump_col, bat_col)
         if res is not None:
             results[lvl] = res
 
@@ -127,39 +143,50 @@ def main():
     # --- Overlay plot with regression lines ---
     fig_path = fig_dir / "cmj_batspeed_by_level.png"
 
-    plt.figure()
-    # Scatter each group + line
-    all_x = []
-    for lvl in levels:
-        if lvl not in results:
-            continue
-        x = results[lvl]["x"]
-        y = results[lvl]["y"]
-        all_x.append(x)
-        plt.scatter(x, y, label=f"{lvl} (n={results[lvl]['rows']})")
+    plotted = [lvl for lvl in levels if lvl in results]
+    if len(plotted) == 0:
+        raise ValueError("No levels had enough data after filtering to plot.")
+
+    # One scatter call for every level: each point carries its level's color
+    palette = [f"C{i}" for i in range(len(plotted))]
+    all_x = np.concatenate([results[lvl]["x"] for lvl in plotted])
+    all_y = np.concatenate([results[lvl]["y"] for lvl in plotted])
+    level_codes = np.repeat(np.arange(len(plotted)), [results[lvl]["rows"] for lvl in plotted])
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.scatter(all_x, all_y, c=to_rgba_array(palette)[level_codes], rasterized=True)
+    handles = [
+        Line2D([], [], marker="o", linestyle="", color=palette[i], label=f"{lvl} (n={results[lvl]['rows']})")
+        for i, lvl in enumerate(plotted)
+    ]
 
     # Use global x-range for lines
-    if len(all_x) == 0:
-        raise ValueError("No levels had enough data after filtering to plot.")
-    x_min = float(np.min(np.concatenate(all_x)))
-    x_max = float(np.max(np.concatenate(all_x)))
+    x_min = float(all_x.min())
+    x_max = float(all_x.max())
     x_line = np.linspace(x_min, x_max, 200)
 
-    for lvl in levels:
-        if lvl not in results:
-            continue
-        m = results[lvl]["m"]
-        b = results[lvl]["b"]
-        y_line = m * x_line + b
-        plt.plot(x_line, y_line, label=f"{lvl} fit (r={results[lvl]['r']:.2f})")
-
-    plt.xlabel("CMJ Jump Height (cm)")
-    plt.ylabel("Bat Speed (mph)")
-    plt.title("CMJ → Bat Speed (Filtered) | Regression Line per Level")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(fig_path, dpi=220)
-    plt.close()
+    # All fit lines in one broadcast: row i is level i
+    ms = np.array([results[lvl]["m"] for lvl in plotted])
+    bs = np.array([results[lvl]["b"] for lvl in plotted])
+    y_lines = ms[:, None] * x_line[None, :] + bs[:, None]
+
+    for i, lvl in enumerate(plotted):
+        (line,) = ax.plot(x_line, y_lines[i], color=palette[i], label=f"{lvl} fit (r={results[lvl]['r']:.2f})")
+        handles.append(line)
+
+    ax.set_xlabel("CMJ Jump Height (cm)")
+    ax.set_ylabel("Bat Speed (mph)")
+    ax.set_title("CMJ → Bat Speed (Filtered) | Regression Line per Level")
+    ax.legend(handles=handles)
+    fig.tight_layout()
+
+    # Encode the PNG once: same bytes go to disk for the HTML and straight into the PDF
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=220)
+    fig_w_in, fig_h_in = fig.get_size_inches()
+    plt.close(fig)
+    png_bytes = buf.getvalue()
+    fig_path.write_bytes(png_bytes)
 
     # --- HTML report ---
     html_path = out_dir / "driveline_transfer_report.html"
@@ -177,12 +204,10 @@ def main():
         <hr>
         """
 
-    sections = ""
-    for lvl in levels:
-        if lvl in results:
-            sections += block(lvl, results[lvl])
-        else:
-            sections += f"<h2>{lvl}</h2><p><i>Not enough data after filtering.</i></p><hr>"
+    def no_data_block(lvl):
+        return f"<h2>{lvl}</h2><p><i>Not enough data after filtering.</i></p><hr>"
+
+    sections = "".join(block(lvl, results[lvl]) if lvl in results else no_data_block(lvl) for lvl in levels)
 
     html = f"""
     <html>
@@ -229,9 +254,9 @@ def main():
         y -= 18
 
         # Add overlay plot image
-        img = ImageReader(str(fig_path))
+        img = ImageReader(BytesIO(png_bytes))
         img_w = width - 80
-        img_h = img_w * 0.62  # good aspect for letter
+        img_h = img_w * fig_h_in / fig_w_in  # box matches the figure, so no letterboxing
         c.drawImage(img, 40, y - img_h, width=img_w, height=img_h, preserveAspectRatio=True, mask="auto")
         y = y - img_h - 18
 
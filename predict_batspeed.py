@@ -1,34 +1,61 @@
 import argparse
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from src.io import ensure_numeric, read_csv_cached, select_level
 
-def find_col(df: pd.DataFrame, must_contain: list[str]) -> str:
-    for c in df.columns:
+
+# Bootstrap resamples fitted per vectorized block
+BOOT_BLOCK_ROWS = 256
+
+
+@lru_cache(maxsize=32)
+def _find_col(cols: tuple[str, ...], must_contain: tuple[str, ...]) -> str:
+    must = [s.lower() for s in must_contain]
+    for c in cols:
         lc = c.lower()
-        if all(s.lower() in lc for s in must_contain):
+        if all(s in lc for s in must):
             return c
-    raise ValueError(f"Could not find column containing: {must_contain}")
+    raise ValueError(f"Could not find column containing: {list(must_contain)}")
+
+
+def find_col(df: pd.DataFrame, must_contain: list[str]) -> str:
+    return _find_col(tuple(df.columns), tuple(must_contain))
 
 
 def fit_line(x: np.ndarray, y: np.ndarray):
-    m, b = np.polyfit(x, y, 1)
-    return float(m), float(b)
+    xm = x.mean()
+    ym = y.mean()
+    m = ((x - xm) * (y - ym)).sum() / ((x - xm) ** 2).sum()
+    return float(m), float(ym - m * xm)
 
 
-def bootstrap_single_prediction(x, y, x_new, n_boot=2000, seed=42):
+def bootstrap_single_prediction(x, y, x_new, n_boot=2000, seed=42, block=BOOT_BLOCK_ROWS):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
     rng = np.random.default_rng(seed)
     n = len(x)
-    preds = np.zeros(n_boot)
+    preds = np.empty(n_boot)
 
-    for i in range(n_boot):
-        idx = rng.integers(0, n, size=n)
+    # Resample in fixed-size row blocks: vectorized fits, but memory stays O(block * n).
+    # Blocks are drawn in order, so the index stream matches one draw per resample.
+    for start in range(0, n_boot, block):
+        rows = min(block, n_boot - start)
+        idx = rng.integers(0, n, size=(rows, n))
         xb = x[idx]
         yb = y[idx]
-        m, b = fit_line(xb, yb)
-        preds[i] = m * x_new + b
+
+        # Closed-form OLS slope/intercept for every row.
+        # Centering x alone is enough: sum((x - xm) * (y - ym)) == sum((x - xm) * y)
+        xm = xb.mean(axis=1)
+        ym = yb.mean(axis=1)
+        xb -= xm[:, None]
+        m = (xb * yb).sum(axis=1) / (xb * xb).sum(axis=1)
+        b = ym - m * xm
+        preds[start:start + rows] = m * x_new + b
 
     mean = preds.mean()
     low = np.percentile(preds, 2.5)
@@ -44,14 +71,14 @@ def main():
     ap.add_argument("--athlete_cmj", type=float, required=True)
     args = ap.parse_args()
 
-    df = pd.read_csv(args.input)
+    df = read_csv_cached(args.input)
 
     jump_col = find_col(df, ["jump_height", "mean_cmj"])
 
     # Prefer bat_speed_mph, otherwise use hitting_max_hss
     bat_col = None
     if "bat_speed_mph" in df.columns:
-        df["bat_speed_mph"] = pd.to_numeric(df["bat_speed_mph"], errors="coerce")
+        df = ensure_numeric(df, "bat_speed_mph")
         if df["bat_speed_mph"].notna().sum() > 10:
             bat_col = "bat_speed_mph"
 
@@ -61,10 +88,10 @@ def main():
         bat_col = "hitting_max_hss"
 
     if args.level.lower() != "all" and "playing_level" in df.columns:
-        df = df[df["playing_level"].str.lower() == args.level.lower()]
+        df = select_level(df, "playing_level", args.level)
 
-    df[jump_col] = pd.to_numeric(df[jump_col], errors="coerce")
-    df[bat_col] = pd.to_numeric(df[bat_col], errors="coerce")
+    df = ensure_numeric(df, jump_col)
+    df = ensure_numeric(df, bat_col)
 
     df = df.dropna(subset=[jump_col, bat_col])
 
@@ -1,39 +1,66 @@
 import argparse
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from src.io import ensure_numeric, read_csv_cached, select_level
+
+
+# Above this many athletes the residual plot switches from a scatter to a hexbin
+HEXBIN_MIN_ROWS = 2000
+
+
+@lru_cache(maxsize=32)
+def _lowered(cols: tuple[str, ...]) -> tuple[str, ...]:
+    return tuple(c.lower() for c in cols)
 
-def pick_column(df: pd.DataFrame, preferred: list[str], must_contain: list[str], avoid_contains: list[str] | None = None) -> str:
-    """
-    1) If any preferred column exists EXACTLY, use it.
-    2) Else, find a column containing all must_contain and none of avoid_contains.
-    """
-    avoid_contains = avoid_contains or []
-    cols = list(df.columns)
 
+@lru_cache(maxsize=32)
+def _pick_column(cols: tuple[str, ...], preferred: tuple[str, ...], must_contain: tuple[str, ...], avoid_contains: tuple[str, ...]) -> str:
     # 1) exact match preference
     for name in preferred:
-        if name in df.columns:
+        if name in cols:
             return name
 
     # 2) fallback search
-    for c in cols:
-        lc = c.lower()
-        if all(s.lower() in lc for s in must_contain) and not any(bad.lower() in lc for bad in avoid_contains):
+    must = [s.lower() for s in must_contain]
+    avoid = [bad.lower() for bad in avoid_contains]
+    for c, lc in zip(cols, _lowered(cols)):
+        if all(s in lc for s in must) and not any(bad in lc for bad in avoid):
             return c
 
     raise ValueError(
-        f"Could not pick column. preferred={preferred}, must_contain={must_contain}, avoid_contains={avoid_contains}. "
-        f"Example cols: {cols[:35]}"
+        f"Could not pick column. preferred={list(preferred)}, must_contain={list(must_contain)}, avoid_contains={list(avoid_contains)}. "
+        f"Example cols: {list(cols[:35])}"
     )
 
 
+def pick_column(df: pd.DataFrame, preferred: list[str], must_contain: list[str], avoid_contains: list[str] | None = None) -> str:
+    """
+    1) If any preferred column exists EXACTLY, use it.
+    2) Else, find a column containing all must_contain and none of avoid_contains.
+    Lookups are memoized on the column names, which are lowercased once per set.
+    """
+    return _pick_column(tuple(df.columns), tuple(preferred), tuple(must_contain), tuple(avoid_contains or []))
+
+
 def fit_line(x: np.ndarray, y: np.ndarray) -> tuple[float, float]:
-    m, b = np.polyfit(x, y, 1)
-    return float(m), float(b)
+    xm = x.mean()
+    ym = y.mean()
+    m = ((x - xm) * (y - ym)).sum() / ((x - xm) ** 2).sum()
+    return float(m), float(ym - m * xm)
+
+
+def top_k_indices(values: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest values, largest first (partial sort, no full ranking)."""
+    k = min(k, len(values))
+    if k <= 0:
+        return np.array([], dtype=int)
+    idx = np.argpartition(-values, k - 1)[:k]
+    return idx[np.argsort(-values[idx], kind="stable")]
 
 
 def main():
@@ -43,7 +70,7 @@ def main():
     ap.add_argument("--top_n", type=int, default=15)
     args = ap.parse_args()
 
-    df = pd.read_csv(args.input)
+    df = read_csv_cached(args.input)
 
     # Force the REAL numeric columns if they exist
     jump_col = pick_column(
@@ -64,11 +91,11 @@ def main():
 
     # Optional filter by playing level
     if args.level.lower() != "all" and level_col is not None:
-        df = df[df[level_col].astype(str).str.lower() == args.level.lower()].copy()
+        df = select_level(df, level_col, args.level)
 
     # Convert to numeric + drop missing
-    df[jump_col] = pd.to_numeric(df[jump_col], errors="coerce")
-    df[bat_col] = pd.to_numeric(df[bat_col], errors="coerce")
+    df = ensure_numeric(df, jump_col)
+    df = ensure_numeric(df, bat_col)
     df = df.dropna(subset=[jump_col, bat_col]).copy()
 
     if len(df) < 20:
@@ -103,8 +130,8 @@ def main():
     if athlete_id_col:
         df_out.insert(0, athlete_id_col, df[athlete_id_col].astype(str).values)
 
-    top_over = df_out.sort_values("residual_mph", ascending=False).head(args.top_n)
-    top_under = df_out.sort_values("residual_mph", ascending=True).head(args.top_n)
+    top_over = df_out.iloc[top_k_indices(residual, args.top_n)]
+    top_under = df_out.iloc[top_k_indices(-residual, args.top_n)]
 
     out_dir = Path("reports")
     fig_dir = out_dir / "figures"
@@ -118,18 +145,22 @@ def main():
 
     df_out.to_csv(csv_path, index=False)
 
-    plt.figure()
-    plt.scatter(df_out["cmj_jump_height_cm"], df_out["actual_bat_speed_mph"], label="Actual")
-    x_line = np.linspace(df_out["cmj_jump_height_cm"].min(), df_out["cmj_jump_height_cm"].max(), 100)
+    fig, ax = plt.subplots()
+    if len(df_out) > HEXBIN_MIN_ROWS:
+        # Large cohorts: bin the points so render cost tracks the grid, not N
+        ax.hexbin(x, y, gridsize=50, cmap="Blues", mincnt=1, label="Actual")
+    else:
+        ax.scatter(x, y, label="Actual", rasterized=True)
+    x_line = np.linspace(float(x.min()), float(x.max()), 100)
     y_line = m * x_line + b
-    plt.plot(x_line, y_line, label="Model Fit")
-    plt.xlabel("CMJ Jump Height (cm)")
-    plt.ylabel("Bat Speed (mph)")
-    plt.title(f"Residuals: Actual − Predicted ({args.level})")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(fig_path, dpi=200)
-    plt.close()
+    ax.plot(x_line, y_line, label="Model Fit")
+    ax.set_xlabel("CMJ Jump Height (cm)")
+    ax.set_ylabel("Bat Speed (mph)")
+    ax.set_title(f"Residuals: Actual − Predicted ({args.level})")
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(fig_path, dpi=200)
+    plt.close(fig)
 
     def to_html_table(d: pd.DataFrame) -> str:
         return d.to_html(index=False, float_format=lambda v: f"{v:.2f}")
@@ -1,16 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pac
+
+
+# Parquet metadata key holding the size/mtime of the CSV a cache file was built from
+_SOURCE_KEY = b"cmj_source_csv"
+
+
+def _cache_dir() -> Path:
+    return Path(os.environ.get("CMJ_CACHE_DIR", Path.home() / ".cache" / "cmj-batspeed-transfer"))
+
+
+def _source_stamp(csv_path: Path) -> bytes:
+    st = csv_path.stat()
+    return json.dumps({"size": st.st_size, "mtime_ns": st.st_mtime_ns}).encode()
+
+
+def _write_cache(df: pd.DataFrame, pq_path: Path, stamp: bytes) -> None:
+    """Write the parquet cache through a temp file so a failed write never leaves a partial cache."""
+    tmp = None
+    try:
+        pq_path.parent.mkdir(parents=True, exist_ok=True)
+        tbl = pa.Table.from_pandas(df, preserve_index=False)
+        tbl = tbl.replace_schema_metadata({**(tbl.schema.metadata or {}), _SOURCE_KEY: stamp})
+        fd, tmp = tempfile.mkstemp(dir=pq_path.parent, suffix=".parquet.tmp")
+        os.close(fd)
+        pq.write_table(tbl, tmp)
+        os.replace(tmp, pq_path)
+    except (OSError, pa.ArrowException):
+        # Unwritable cache folder or a column parquet can't store: just skip the cache
+        if tmp is not None and os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def read_csv_cached(path: str) -> pd.DataFrame:
+    """
+    Read a CSV with the pyarrow parser and cache the parsed frame as parquet.
+    The cache lives in CMJ_CACHE_DIR (default ~/.cache/cmj-batspeed-transfer), not the data folder,
+    and is only reused when the CSV's size and mtime match the ones it was built from exactly.
+    """
+    csv_path = Path(path).resolve()
+    stamp = _source_stamp(csv_path)
+    pq_path = _cache_dir() / f"{hashlib.sha1(str(csv_path).encode()).hexdigest()}.parquet"
+
+    try:
+        if (pq.read_schema(pq_path).metadata or {}).get(_SOURCE_KEY) == stamp:
+            return pd.read_parquet(pq_path)
+    except (OSError, ValueError, pa.ArrowException):
+        # Missing or unreadable cache: parse the CSV instead
+        pass
+
+    try:
+        df = pd.read_csv(csv_path, engine="pyarrow")
+    except pd.errors.ParserError:
+        # pyarrow rejects short rows that the default parser pads with NaN
+        df = pd.read_csv(csv_path)
+
+    _write_cache(df, pq_path, stamp)
+    return df
+
+
+def ensure_numeric(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    """Coerce col to numbers (bad values -> NaN), skipping the pass if it is already numeric."""
+    if pd.api.types.is_numeric_dtype(df[col]):
+        return df
+    return df.assign(**{col: pd.to_numeric(df[col], errors="coerce")})
+
+
+def select_level(df: pd.DataFrame, level_col: str, level: str) -> pd.DataFrame:
+    """Rows whose level matches `level`, ignoring case."""
+    return df[df[level_col].astype(str).str.lower() == level.lower()]
+
 
 def load_force_csv(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+    # Read the header first so only time_s / force_n get parsed
+    header = pd.read_csv(path, nrows=0)
 
     # Handle accidental empty file early with a clear message
-    if df.shape[1] == 0 or df.shape[0] == 0:
+    if header.shape[1] == 0:
         raise ValueError(f"CSV looks empty or has no columns: {path}. Make sure it is saved and has a header row.")
 
-    df.columns = [c.strip() for c in df.columns]
+    raw_names = {c.strip(): c for c in header.columns}
+
+    if "time_s" not in raw_names or "force_n" not in raw_names:
+        raise ValueError(f"CSV must have columns time_s, force_n. Found: {list(raw_names)}")
 
-    if "time_s" not in df.columns or "force_n" not in df.columns:
-        raise ValueError(f"CSV must have columns time_s, force_n. Found: {list(df.columns)}")
+    # Timestamps stay float64 so the 0–200 ms window edges don't drift on long captures
+    convert = pac.ConvertOptions(
+        column_types={raw_names["time_s"]: pa.float64(), raw_names["force_n"]: pa.float32()},
+        include_columns=[raw_names["time_s"], raw_names["force_n"]],
+    )
+    with pa.memory_map(str(path)) as source:
+        tbl = pac.read_csv(source, convert_options=convert)
 
-    return df[["time_s", "force_n"]].copy()
+    if tbl.num_rows == 0:
+        raise ValueError(f"CSV looks empty or has no columns: {path}. Make sure it is saved and has a header row.")
+
+    df = tbl.to_pandas()
+    df.columns = [c.strip() for c in df.columns]
 
+    return df
@@ -1,58 +1,69 @@
+import os
+
 import numpy as np
 import pandas as pd
 
+# numba is opt-in: importing and loading the compiled core costs more than the
+# NumPy core takes on a single capture, so only batch jobs should turn it on.
+njit = None
+if os.environ.get("CMJ_USE_NUMBA") == "1":
+    try:
+        from numba import njit
+    except ImportError:  # fall back to the NumPy implementation
+        njit = None
 
-def _force_at_time(time_s: np.ndarray, force: np.ndarray, t: float) -> float:
-    """Return force at time t using nearest available sample."""
-    idx = int(np.argmin(np.abs(time_s - t)))
-    return float(force[idx])
 
+BW_WINDOW_S = 0.25
 
-def _impulse_trapz(t: np.ndarray, f: np.ndarray) -> float:
-    """Manual trapezoidal integration: sum((f[i]+f[i-1])/2 * dt)."""
-    imp = 0.0
-    for i in range(1, len(t)):
-        dt = float(t[i] - t[i - 1])
-        imp += float((f[i] + f[i - 1]) / 2.0) * dt
-    return float(imp)
 
+def _nearest_indices(time_s: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Nearest-sample index for each target on a sorted time axis (ties go to the earlier sample)."""
+    j = np.searchsorted(time_s, targets, side="left")
+    lo = np.clip(j - 1, 0, len(time_s) - 1)
+    # j - 1 is the last of a run of equal timestamps; argmin would pick the first
+    lo = np.searchsorted(time_s, time_s[lo], side="left")
+    hi = np.clip(j, 0, len(time_s) - 1)
+    take_lo = np.abs(targets - time_s[lo]) <= np.abs(time_s[hi] - targets)
+    return np.where(take_lo, lo, hi)
 
-def compute_cmj_metrics(df: pd.DataFrame, sampling_rate: int) -> dict:
-    force = df["force_n"].to_numpy(dtype=float)
-    time_s = df["time_s"].to_numpy(dtype=float)
 
-    if len(force) < 3:
-        raise ValueError("Not enough rows in file.")
+def _impulse_trapz(t: np.ndarray, f: np.ndarray) -> float:
+    """Trapezoidal integration: sum((f[i]+f[i-1])/2 * dt)."""
+    return float(np.trapezoid(f, t))
+
 
+def _cmj_core_numpy(time_s: np.ndarray, force: np.ndarray, bw_window_s: float = BW_WINDOW_S) -> tuple:
+    """
+    NumPy version of the metrics core. Returns the same tuple as _cmj_core_loop.
+    Assumes time_s is increasing, so window edges are found by binary search.
+    """
     # Use first timestamp as start
     t0 = float(time_s[0])
 
+    # Samples at or before each window edge: 200 ms impulse window, BW window
+    i_200, i_bw = np.searchsorted(time_s, [t0 + 0.20, t0 + bw_window_s], side="right")
+
     # -----------------------
     # 1) Estimate Bodyweight
     # -----------------------
     # Use first 0.25s if available, otherwise use first 10% of samples (min 5 samples)
-    bw_window_s = 0.25
-    mask_bw = time_s <= (t0 + bw_window_s)
-
-    if np.sum(mask_bw) < 5:
+    if i_bw < 5:
         n = max(5, int(len(force) * 0.10))
         n = min(n, len(force))
         bw_n = float(np.mean(force[:n]))
     else:
-        bw_n = float(np.mean(force[mask_bw]))
+        bw_n = float(np.mean(force[:i_bw]))
 
     # -----------------------
     # 2) Basic metrics
     # -----------------------
-    peak_force = float(np.max(force))
     peak_i = int(np.argmax(force))
+    peak_force = float(force[peak_i])
     time_to_peak_ms = float((time_s[peak_i] - t0) * 1000.0)  # relative to t0
 
-    # Early force samples for RFD (absolute force)
+    # Early force samples for RFD (absolute force, nearest sample)
     f0 = float(force[0])
-    f_50 = _force_at_time(time_s, force, t0 + 0.05)
-    f_100 = _force_at_time(time_s, force, t0 + 0.10)
-    f_200 = _force_at_time(time_s, force, t0 + 0.20)
+    f_50, f_100, f_200 = force[_nearest_indices(time_s, t0 + np.array([0.05, 0.10, 0.20]))].astype(float)
 
     rfd_0_50 = float((f_50 - f0) / 0.05)
     rfd_0_100 = float((f_100 - f0) / 0.10)
@@ -61,9 +72,8 @@ def compute_cmj_metrics(df: pd.DataFrame, sampling_rate: int) -> dict:
     # -----------------------
     # 3) Impulse 0–200ms
     # -----------------------
-    mask_200 = time_s <= (t0 + 0.20)
-    t_window = time_s[mask_200]
-    f_window = force[mask_200]
+    t_window = time_s[:i_200]
+    f_window = force[:i_200]
 
     # Total impulse (includes BW)
     impulse_0_200_ns = _impulse_trapz(t_window, f_window)
@@ -78,17 +88,155 @@ def compute_cmj_metrics(df: pd.DataFrame, sampling_rate: int) -> dict:
     peak_force_xbw = float(peak_force / bw_n) if bw_n != 0 else float("nan")
     net_peak_force_n = float(peak_force - bw_n)
 
-    return {
-        "bw_n": bw_n,
-        "peak_force_n": peak_force,
-        "peak_force_xbw": peak_force_xbw,
-        "net_peak_force_n": net_peak_force_n,
-        "time_to_peak_ms": time_to_peak_ms,
-        "rfd_0_50_n_per_s": rfd_0_50,
-        "rfd_0_100_n_per_s": rfd_0_100,
-        "rfd_0_200_n_per_s": rfd_0_200,
-        "impulse_0_200_ns": impulse_0_200_ns,
-        "net_impulse_0_200_ns": net_impulse_0_200_ns,
-    }
+    return (
+        bw_n,
+        peak_force,
+        peak_force_xbw,
+        net_peak_force_n,
+        time_to_peak_ms,
+        rfd_0_50,
+        rfd_0_100,
+        rfd_0_200,
+        impulse_0_200_ns,
+        net_impulse_0_200_ns,
+    )
+
+
+def _cmj_core_loop(time_s, force, bw_window_s=BW_WINDOW_S):
+    """Single forward sweep over the samples, meant to be compiled with numba."""
+    n = len(force)
+    t0 = time_s[0]
+    t_bw = t0 + bw_window_s
+    t_50 = t0 + 0.05
+    t_100 = t0 + 0.10
+    t_200 = t0 + 0.20
+
+    bw_sum = 0.0
+    bw_count = 0
+
+    peak_force = force[0]
+    peak_i = 0
+
+    # nearest sample to each RFD endpoint (first index wins ties, like argmin)
+    i_50 = 0
+    i_100 = 0
+    i_200 = 0
+    d_50 = abs(time_s[0] - t_50)
+    d_100 = abs(time_s[0] - t_100)
+    d_200 = abs(time_s[0] - t_200)
+
+    # trapezoid over the samples inside the 0–200 ms window
+    impulse = 0.0
+    window_dt = 0.0
+    prev = -1
+
+    for i in range(n):
+        t = time_s[i]
+        f = force[i]
+
+        if t <= t_bw:
+            bw_sum += f
+            bw_count += 1
+
+        # NaN wins and sticks, like np.max / np.argmax
+        if peak_force == peak_force and (f > peak_force or f != f):
+            peak_force = f
+            peak_i = i
+
+        d = abs(t - t_50)
+        if d < d_50:
+            d_50 = d
+            i_50 = i
+        d = abs(t - t_100)
+        if d < d_100:
+            d_100 = d
+            i_100 = i
+        d = abs(t - t_200)
+        if d < d_200:
+            d_200 = d
+            i_200 = i
+
+        if t <= t_200:
+            if prev >= 0:
+                dt = t - time_s[prev]
+                impulse += (f + force[prev]) * 0.5 * dt
+                window_dt += dt
+            prev = i
+
+    if bw_count < 5:
+        m = max(5, int(n * 0.10))
+        m = min(m, n)
+        bw_sum = 0.0
+        for i in range(m):
+            bw_sum += force[i]
+        bw_n = bw_sum / m
+    else:
+        bw_n = bw_sum / bw_count
+
+    f0 = force[0]
+    rfd_0_50 = (force[i_50] - f0) / 0.05
+    rfd_0_100 = (force[i_100] - f0) / 0.10
+    rfd_0_200 = (force[i_200] - f0) / 0.20
 
+    # trapz(f - bw) == trapz(f) - bw * sum(dt)
+    net_impulse = impulse - bw_n * window_dt
 
+    if bw_n != 0:
+        peak_force_xbw = peak_force / bw_n
+    else:
+        peak_force_xbw = np.nan
+
+    return (
+        bw_n,
+        peak_force,
+        peak_force_xbw,
+        peak_force - bw_n,
+        (time_s[peak_i] - t0) * 1000.0,
+        rfd_0_50,
+        rfd_0_100,
+        rfd_0_200,
+        impulse,
+        net_impulse,
+    )
+
+
+if njit is not None:
+    # No fastmath: it lets the compiler assume NaN-free input, and blank force cells load as NaN
+    _cmj_core = njit(cache=True)(_cmj_core_loop)
+else:
+    _cmj_core = _cmj_core_numpy
+
+
+def compute_cmj_metrics(df: pd.DataFrame, sampling_rate: int) -> dict:
+    # float32 is plenty for force-plate ADC samples; timestamps stay float64 for the window edges
+    force = df["force_n"].to_numpy(dtype=np.float32)
+    time_s = df["time_s"].to_numpy(dtype=np.float64)
+
+    if len(force) < 3:
+        raise ValueError("Not enough rows in file.")
+
+    (
+        bw_n,
+        peak_force,
+        peak_force_xbw,
+        net_peak_force_n,
+        time_to_peak_ms,
+        rfd_0_50,
+        rfd_0_100,
+        rfd_0_200,
+        impulse_0_200_ns,
+        net_impulse_0_200_ns,
+    ) = _cmj_core(time_s, force)
+
+    return {
+        "bw_n": float(bw_n),
+        "peak_force_n": float(peak_force),
+        "peak_force_xbw": float(peak_force_xbw),
+        "net_peak_force_n": float(net_peak_force_n),
+        "time_to_peak_ms": float(time_to_peak_ms),
+        "rfd_0_50_n_per_s": float(rfd_0_50),
+        "rfd_0_100_n_per_s": float(rfd_0_100),
+        "rfd_0_200_n_per_s": float(rfd_0_200),
+        "impulse_0_200_ns": float(impulse_0_200_ns),
+        "net_impulse_0_200_ns": float(net_impulse_0_200_ns),
+    }
@@ -4,12 +4,12 @@ import pandas as pd
 
 def save_force_time_plot(df: pd.DataFrame, out_path: str, title: str) -> str:
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    plt.figure()
-    plt.plot(df["time_s"], df["force_n"])
-    plt.xlabel("Time (s)")
-    plt.ylabel("Force (N)")
-    plt.title(title)
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=160)
-    plt.close()
+    fig, ax = plt.subplots()
+    ax.plot(df["time_s"], df["force_n"])
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Force (N)")
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=160)
+    plt.close(fig)
     return out_path
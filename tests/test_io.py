@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.io import read_csv_cached
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    d = tmp_path / "cache"
+    monkeypatch.setenv("CMJ_CACHE_DIR", str(d))
+    return d
+
+
+def _write(path, frame, mtime_ns=None):
+    frame.to_csv(path, index=False)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_cache_is_reused_and_kept_out_of_data_folder(tmp_path, cache_dir):
+    csv = tmp_path / "in.csv"
+    _write(csv, pd.DataFrame({"x": [1.0, 2.0]}))
+
+    first = read_csv_cached(csv)
+    cached = list(cache_dir.glob("*.parquet"))
+    assert len(cached) == 1
+    assert not list(tmp_path.glob("*.parquet"))
+    pd.testing.assert_frame_equal(read_csv_cached(csv), first)
+
+
+def test_replaced_csv_with_older_mtime_is_reparsed(tmp_path, cache_dir):
+    csv = tmp_path / "in.csv"
+    _write(csv, pd.DataFrame({"x": [1.0, 2.0]}))
+    read_csv_cached(csv)
+
+    # e.g. cp -p / rsync -t of a different dataset: older mtime than the cache file
+    _write(csv, pd.DataFrame({"x": [5.0, 6.0, 7.0]}), mtime_ns=1_000_000_000)
+    assert read_csv_cached(csv)["x"].tolist() == [5.0, 6.0, 7.0]
+
+
+def test_corrupt_cache_falls_back_to_csv(tmp_path, cache_dir):
+    csv = tmp_path / "in.csv"
+    _write(csv, pd.DataFrame({"x": [1.0, 2.0]}))
+    read_csv_cached(csv)
+
+    (cached,) = cache_dir.glob("*.parquet")
+    cached.write_bytes(b"not parquet")
+    assert read_csv_cached(csv)["x"].tolist() == [1.0, 2.0]
+
+
+def test_short_rows_are_padded_with_nan(tmp_path, cache_dir):
+    csv = tmp_path / "ragged.csv"
+    csv.write_text("a,b\n1,2\n3\n")
+
+    df = read_csv_cached(csv)
+    assert df["a"].tolist() == [1, 3]
+    assert df["b"].isna().tolist() == [False, True]
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.metrics import _cmj_core_loop, _cmj_core_numpy, _nearest_indices, compute_cmj_metrics
+
+
+def _capture(fs: int, duration_s: float, t0: float = 0.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    t = t0 + np.arange(max(3, int(fs * duration_s))) / fs
+    f = 700 + 300 * np.sin(t * 3) + rng.normal(0, 5, len(t))
+    return t, f.astype(np.float32)
+
+
+def _nan_at(i):
+    t, f = _capture(1000, 1.0)
+    f[i] = np.nan
+    return t, f
+
+
+def _duplicate_timestamps():
+    # repeated samples at every timestamp
+    t = np.repeat(np.arange(0.0, 0.5, 0.01), 2)
+    f = (700 + 1000 * t + np.arange(len(t))).astype(np.float32)
+    return t, f
+
+
+def _duplicate_tie():
+    # each RFD endpoint sits exactly halfway between a duplicated sample and the next one
+    d = 0.0078125
+    t = [0.0]
+    for edge in (0.05, 0.10, 0.20):
+        t += [edge - d, edge - d, edge + d]
+    t = np.array(t + [0.3])
+    return t, (700 + 10 * np.arange(len(t))).astype(np.float32)
+
+
+CASES = {
+    "duplicate_timestamps": _duplicate_timestamps(),
+    "duplicate_tie": _duplicate_tie(),
+    "1khz": _capture(1000, 2.0),
+    "offset_clock": _capture(333, 3.0, t0=1.2345),
+    "short_bw_window": _capture(10, 1.0),
+    "few_rows": _capture(1000, 0.004),
+    "nan_mid": _nan_at(100),
+    "nan_first": _nan_at(0),
+    "nan_after_window": _nan_at(600),
+}
+
+
+def _assert_same(a, b):
+    np.testing.assert_allclose(np.array(a, dtype=float), np.array(b, dtype=float), rtol=1e-5, atol=1e-6, equal_nan=True)
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_loop_matches_numpy_core(name):
+    t, f = CASES[name]
+    _assert_same(_cmj_core_loop(t, f), _cmj_core_numpy(t, f))
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_compiled_loop_matches_numpy_core(name):
+    numba = pytest.importorskip("numba")
+    t, f = CASES[name]
+    _assert_same(numba.njit(_cmj_core_loop)(t, f), _cmj_core_numpy(t, f))
+
+
+def test_nearest_sample_picks_first_duplicate():
+    t = np.array([0.0, 0.25, 0.25, 0.75])
+    assert _nearest_indices(t, np.array([0.5])).tolist() == [int(np.argmin(np.abs(t - 0.5)))] == [1]
+
+
+def test_nan_force_propagates_to_peak():
+    t, f = CASES["nan_mid"]
+    metrics = compute_cmj_metrics(pd.DataFrame({"time_s": t, "force_n": f}), 1000)
+    assert np.isnan(metrics["peak_force_n"])
+    assert metrics["time_to_peak_ms"] == pytest.approx(100.0)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from predict_batspeed import bootstrap_single_prediction
+
+
+def _reference(x, y, x_new, n_boot, seed):
+    # the original one-resample-at-a-time loop
+    rng = np.random.default_rng(seed)
+    preds = np.zeros(n_boot)
+    for i in range(n_boot):
+        idx = rng.integers(0, len(x), size=len(x))
+        m, b = np.polyfit(x[idx], y[idx], 1)
+        preds[i] = m * x_new + b
+    return preds.mean(), np.percentile(preds, 2.5), np.percentile(preds, 97.5)
+
+
+@pytest.mark.parametrize("block", [1, 7, 256, 5000])
+def test_blocked_bootstrap_matches_per_resample_loop(block):
+    rng = np.random.default_rng(1)
+    x = rng.normal(35, 5, 300)
+    y = 0.4 * x + 55 + rng.normal(0, 3, 300)
+
+    got = bootstrap_single_prediction(x, y, 35.0, n_boot=600, seed=42, block=block)
+    np.testing.assert_allclose(got, _reference(x, y, 35.0, n_boot=600, seed=42), rtol=1e-10)